@@ -0,0 +1,300 @@
+import os
+import time
+import logging
+import functools
+import threading
+from flask import make_response, current_app
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+# Bloom filter of registered file hashes (needs RedisBloom / Redis Stack).
+# 1M items at 0.1% false positives is roughly 1.8 MB of Redis memory.
+BLOOM_KEY = 'filehashes'
+BLOOM_STAGING_KEY = 'filehashes:staging'
+BLOOM_SEED_LOCK = 'filehashes:seeding'
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.001
+BLOOM_SEED_BATCH = 1000
+BLOOM_RESEED_RETRY = 30  # seconds between seed attempts
+
+# Cached API responses, one Redis hash per endpoint keyed by parsed parameters
+CACHE_PREFIX = 'cache:'
+CACHE_TTL = 60
+# Bumped by invalidate_cache() so a response computed before a write is never stored
+CACHE_GEN_PREFIX = 'cachegen:'
+
+# Shared counters (e.g. verification totals), seeded from the database when missing
+COUNTER_PREFIX = 'counter:'
+
+# Only bump a counter that has been seeded; a missing key is re-seeded on read instead
+_INCR_IF_SEEDED = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+return false
+"""
+
+_CLIENT = None
+_BLOOM_SUPPORTED = True
+
+# The filter is only consulted once this process has seeded it, and stops being
+# trusted as soon as an add fails (the generation lets an in-flight seed notice)
+_BLOOM_TRUSTED = False
+_BLOOM_GENERATION = 0
+_BLOOM_LOAD_HASHES = None
+_BLOOM_RESEED_LOCK = threading.Lock()
+
+def get_redis():
+    """Return the shared Redis client, or None when Redis is not configured"""
+    global _CLIENT
+
+    if _CLIENT is None and REDIS_URL and redis is not None:
+        _CLIENT = redis.Redis.from_url(REDIS_URL, socket_timeout=2)
+
+    return _CLIENT
+
+def seed_hash_filter(load_hashes):
+    """Rebuild the hash bloom filter from the registry, then swap it in atomically
+
+    The filter is always rebuilt (an existing key may be missing hashes from
+    a failed add) under a staging key and renamed into place once complete,
+    so readers never trust a partially seeded filter.
+    load_hashes is called only after the staging filter exists, which lets
+    add_to_hash_filter() capture uploads that race with the seed query.
+    Returns True once this process trusts the filter.
+    """
+    global _BLOOM_SUPPORTED, _BLOOM_TRUSTED, _BLOOM_LOAD_HASHES
+
+    _BLOOM_LOAD_HASHES = load_hashes
+    client = get_redis()
+    if client is None:
+        return False
+
+    generation = _BLOOM_GENERATION
+    try:
+        # Only one worker seeds; the others fall through to Postgres meanwhile
+        if not client.set(BLOOM_SEED_LOCK, 1, nx=True, ex=300):
+            return False
+
+        try:
+            client.delete(BLOOM_STAGING_KEY)
+            client.execute_command('BF.RESERVE', BLOOM_STAGING_KEY, BLOOM_ERROR_RATE, BLOOM_CAPACITY)
+
+            hashes = load_hashes()
+            for i in range(0, len(hashes), BLOOM_SEED_BATCH):
+                batch = hashes[i:i + BLOOM_SEED_BATCH]
+                client.execute_command('BF.INSERT', BLOOM_STAGING_KEY, 'NOCREATE', 'ITEMS', *batch)
+
+            client.rename(BLOOM_STAGING_KEY, BLOOM_KEY)
+        finally:
+            client.delete(BLOOM_SEED_LOCK)
+    except Exception as e:
+        if redis is not None and isinstance(e, redis.ResponseError):
+            # Plain Redis without the bloom module: stop issuing BF.* commands
+            _BLOOM_SUPPORTED = False
+        logger.warning(f"Hash bloom filter unavailable: {e}")
+        return False
+
+    # An add that failed mid-seed may be missing from what was just renamed in
+    if generation != _BLOOM_GENERATION:
+        return False
+
+    _BLOOM_TRUSTED = True
+    logger.info(f"Seeded hash bloom filter with {len(hashes)} hashes")
+    return True
+
+def schedule_hash_filter_seed(load_hashes=None):
+    """Seed the bloom filter in a background thread, retrying until it succeeds"""
+    if get_redis() is None or not _BLOOM_RESEED_LOCK.acquire(blocking=False):
+        return
+
+    load_hashes = load_hashes or _BLOOM_LOAD_HASHES
+
+    def run():
+        try:
+            while _BLOOM_SUPPORTED and not seed_hash_filter(load_hashes):
+                time.sleep(BLOOM_RESEED_RETRY)
+        finally:
+            _BLOOM_RESEED_LOCK.release()
+
+    threading.Thread(target=run, name="bloom-seed", daemon=True).start()
+
+def _distrust_hash_filter(error):
+    """An add failed: stop trusting the filter and rebuild it"""
+    global _BLOOM_TRUSTED, _BLOOM_GENERATION
+
+    _BLOOM_TRUSTED = False
+    _BLOOM_GENERATION += 1
+    logger.error(f"Failed to add hash to bloom filter, rebuilding filter: {error}")
+
+    # Best effort: other workers fall back to Postgres once the key is gone
+    try:
+        get_redis().delete(BLOOM_KEY)
+    except Exception:
+        pass
+
+    if _BLOOM_LOAD_HASHES is not None:
+        schedule_hash_filter_seed()
+
+def add_to_hash_filter(file_hash):
+    """Record a newly registered hash in the bloom filter"""
+    client = get_redis()
+    if client is None or not _BLOOM_SUPPORTED:
+        return
+
+    # Staging first: if a seed renames it in between, the live key still gets the hash
+    try:
+        client.execute_command('BF.INSERT', BLOOM_STAGING_KEY, 'NOCREATE', 'ITEMS', file_hash)
+    except Exception as e:
+        # No staging filter (no seed running) is expected; anything else may
+        # mean a seed in progress missed this hash
+        if redis is None or not isinstance(e, redis.ResponseError):
+            _distrust_hash_filter(e)
+            return
+
+    try:
+        if client.exists(BLOOM_KEY):
+            client.execute_command('BF.INSERT', BLOOM_KEY, 'NOCREATE', 'ITEMS', file_hash)
+    except Exception as e:
+        # A filter missing this hash would give false negatives
+        _distrust_hash_filter(e)
+
+def hash_maybe_registered(file_hash):
+    """Bloom prefilter: False only when the hash is definitely not registered"""
+    client = get_redis()
+    if client is None or not _BLOOM_SUPPORTED or not _BLOOM_TRUSTED:
+        return True
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(BLOOM_KEY)
+        pipe.execute_command('BF.EXISTS', BLOOM_KEY, file_hash)
+        key_exists, maybe_present = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Bloom filter lookup failed, falling back to database: {e}")
+        return True
+
+    # No filter yet (or evicted): let the database answer
+    return not key_exists or bool(maybe_present)
+
+def increment_counter(name):
+    """Increment a shared counter (no-op without Redis or before it is seeded)"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        client.eval(_INCR_IF_SEEDED, 1, COUNTER_PREFIX + name)
+    except Exception as e:
+        # A counter that missed an event is wrong, so drop it and re-seed on read
+        logger.warning(f"Counter increment failed for {name}, discarding counter: {e}")
+        try:
+            client.delete(COUNTER_PREFIX + name)
+        except Exception:
+            pass
+
+def get_counters(names, load_counts):
+    """Read shared counters, seeding missing ones from load_counts()
+
+    Returns None when Redis is not configured or unreachable, so callers
+    can fall back to load_counts() themselves.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+
+    keys = [COUNTER_PREFIX + name for name in names]
+    try:
+        values = client.mget(keys)
+        if None in values:
+            # NX: a worker that seeded first (and any increments since) wins
+            counts = load_counts()
+            pipe = client.pipeline(transaction=False)
+            for name, key in zip(names, keys):
+                pipe.set(key, counts.get(name, 0), nx=True)
+            pipe.mget(keys)
+            values = pipe.execute()[-1]
+        return {name: int(value) for name, value in zip(names, values)}
+    except Exception as e:
+        logger.warning(f"Counter read failed for {names}: {e}")
+        return None
+
+def cached(key, ttl=CACHE_TTL, vary=None):
+    """Cache a view's successful JSON response body in Redis until invalidated
+
+    vary() returns the cache field for the current request (e.g. the parsed
+    page); views without it keep one entry whatever the query string. If
+    vary() raises ValueError the view answers uncached (bad parameters).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            client = get_redis()
+            if client is None:
+                return view(*args, **kwargs)
+
+            try:
+                field = vary() if vary else '-'
+            except ValueError:
+                return view(*args, **kwargs)
+
+            cache_key = CACHE_PREFIX + key
+            gen_key = CACHE_GEN_PREFIX + key
+
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.hget(cache_key, field)
+                pipe.get(gen_key)
+                body, generation = pipe.execute()
+            except Exception as e:
+                logger.warning(f"Cache read failed for {key}: {e}")
+                return view(*args, **kwargs)
+
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                try:
+                    with client.pipeline() as pipe:
+                        # Only store if no invalidation ran while the view was
+                        # computing; WATCH also catches one landing before EXEC
+                        pipe.watch(gen_key)
+                        if pipe.get(gen_key) == generation:
+                            remaining = pipe.ttl(cache_key)
+                            pipe.multi()
+                            pipe.hset(cache_key, field, response.get_data())
+                            # Arm the TTL once per hash; re-arming on every new field
+                            # would let a rarely invalidated hash live (and grow) forever
+                            if remaining < 0:
+                                pipe.expire(cache_key, ttl)
+                            pipe.execute()
+                except redis.WatchError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"Cache write failed for {key}: {e}")
+            return response
+        return wrapper
+    return decorator
+
+def invalidate_cache(*keys):
+    """Drop cached responses for the given endpoints after a write"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        pipe = client.pipeline()
+        for key in keys:
+            pipe.incr(CACHE_GEN_PREFIX + key)
+            pipe.delete(CACHE_PREFIX + key)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed for {keys}: {e}")
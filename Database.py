@@ -1,12 +1,155 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.extras import RealDictCursor, execute_values
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """Create database connection using DATABASE_URL from environment"""
+# Connection pool sizing (override via environment)
+POOL_MIN_CONN = int(os.environ.get('DATABASE_POOL_MIN', 2))
+POOL_MAX_CONN = int(os.environ.get('DATABASE_POOL_MAX', 20))
+POOL_IDLE_TTL = float(os.environ.get('DATABASE_POOL_IDLE_TTL', 300))
+POOL_SWEEP_INTERVAL = 30
+
+# History events are buffered and inserted in batches by a background thread
+HISTORY_BATCH_SIZE = 500
+HISTORY_FLUSH_INTERVAL = 0.5  # seconds
+HISTORY_SHUTDOWN_TIMEOUT = 5  # seconds
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# Schema setup runs once per process; the advisory lock serializes it across workers
+_DB_READY = False
+_DB_INIT_LOCK = threading.Lock()
+SCHEMA_LOCK_ID = 727274
+
+# JSON files the app stored documents and history in before Postgres;
+# imported once into a fresh database (see _import_legacy_json)
+LEGACY_DB_FILE = "hash_db.json"
+LEGACY_HISTORY_FILE = "history_db.json"
+
+_HIST_Q = queue.Queue()
+_HIST_STOP = object()  # queued at exit to tell the flusher to finish up
+_HIST_FLUSHER = None
+_HIST_FLUSHER_LOCK = threading.Lock()
+
+# Hot queries run as server-side prepared statements: name -> (param types, SQL)
+PREPARED_STATEMENTS = {
+    'save_doc': ('VARCHAR, VARCHAR, VARCHAR, VARCHAR, BIGINT', """
+        INSERT INTO documents (document_id, file_name, file_hash, owner, file_size)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (document_id) DO UPDATE
+        SET file_name = EXCLUDED.file_name,
+            file_hash = EXCLUDED.file_hash,
+            owner = EXCLUDED.owner,
+            file_size = EXCLUDED.file_size
+    """),
+    'get_doc': ('VARCHAR', "SELECT * FROM documents WHERE document_id = $1"),
+    'get_doc_by_hash': ('VARCHAR', "SELECT * FROM documents WHERE file_hash = $1"),
+    'update_tx': ('VARCHAR, INTEGER, VARCHAR', """
+        UPDATE documents
+        SET blockchain_tx = $1,
+            block_number = $2,
+            registered = TRUE,
+            registered_at = CURRENT_TIMESTAMP
+        WHERE document_id = $3
+    """),
+}
+
+class PreparingConnection(connection):
+    """Connection that remembers which statements it has already PREPAREd"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class CachingConnectionPool(ThreadedConnectionPool):
+    """Threaded pool that caches surplus connections for an idle TTL
+    
+    psycopg2's pool closes every connection returned beyond minconn, so bursts
+    churn through fresh handshakes. This pool keeps returned connections open
+    (up to maxconn) and only closes the surplus once it has sat idle for
+    idle_ttl seconds, either on checkout or from a periodic background sweep.
+    """
+    
+    def __init__(self, minconn, maxconn, *args, idle_ttl=300, sweep_interval=30, **kwargs):
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._last_returned = {}  # id(conn) -> monotonic time it went idle
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._schedule_sweep()
+    
+    def getconn(self, key=None):
+        """Reap expired idle connections, then hand out a free one"""
+        with self._lock:
+            self._reap_idle()
+            conn = self._getconn(key)
+            self._last_returned.pop(id(conn), None)
+            return conn
+    
+    def _putconn(self, conn, key=None, close=False):
+        """Keep the connection cached instead of closing surplus ones"""
+        if self.closed:
+            raise PoolError("connection pool is closed")
+        
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise PoolError("trying to put unkeyed connection")
+        
+        if close or conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            conn.close()
+        else:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._pool.append(conn)
+            self._last_returned[id(conn)] = time.monotonic()
+        
+        del self._used[key]
+        del self._rused[id(conn)]
+    
+    def _reap_idle(self):
+        """Close cached connections idle past the TTL, keeping minconn warm"""
+        now = time.monotonic()
+        surplus = len(self._pool) - self.minconn
+        kept = []
+        
+        # _pool is LIFO, so the longest-idle connections sit at the front
+        for conn in self._pool:
+            idle_for = now - self._last_returned.get(id(conn), now)
+            if conn.closed or (surplus > 0 and idle_for > self.idle_ttl):
+                self._last_returned.pop(id(conn), None)
+                conn.close()
+                surplus -= 1
+            else:
+                kept.append(conn)
+        
+        self._pool[:] = kept
+    
+    def _schedule_sweep(self):
+        timer = threading.Timer(self.sweep_interval, self._sweep)
+        timer.daemon = True
+        timer.start()
+    
+    def _sweep(self):
+        with self._lock:
+            if self.closed:
+                return
+            self._reap_idle()
+        self._schedule_sweep()
+
+def get_database_url():
+    """Read DATABASE_URL from environment"""
     database_url = os.environ.get('DATABASE_URL')
     
     if not database_url:
@@ -16,175 +159,399 @@ def get_db_connection():
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
     
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    return database_url
+
+def get_db_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _POOL
+    
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = CachingConnectionPool(
+                    minconn=POOL_MIN_CONN,
+                    maxconn=POOL_MAX_CONN,
+                    idle_ttl=POOL_IDLE_TTL,
+                    sweep_interval=POOL_SWEEP_INTERVAL,
+                    dsn=get_database_url(),
+                    connection_factory=PreparingConnection,
+                    cursor_factory=RealDictCursor,
+                    # Keep CURRENT_TIMESTAMP columns in UTC regardless of server config
+                    options='-c timezone=UTC'
+                )
+                logger.info(f"Database pool created ({POOL_MIN_CONN}-{POOL_MAX_CONN} connections)")
+    
+    return _POOL
+
+@contextmanager
+def db_cursor():
+    """Borrow a pooled connection and yield a cursor, committing on success"""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    
+    try:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+    except Exception:
+        # Drop connections that died mid-query instead of returning them to the pool
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+        raise
+    else:
+        pool.putconn(conn)
 
 def init_db():
-    """Initialize database tables"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Create documents table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS documents (
-            document_id VARCHAR(255) PRIMARY KEY,
-            file_name VARCHAR(500) NOT NULL,
-            file_hash VARCHAR(64) NOT NULL,
-            owner VARCHAR(255) DEFAULT 'anonymous',
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            blockchain_tx VARCHAR(66),
-            block_number INTEGER,
-            registered BOOLEAN DEFAULT FALSE,
-            registered_at TIMESTAMP
+    """Initialize database tables (once per process)"""
+    global _DB_READY
+    
+    if _DB_READY:
+        return
+    
+    with _DB_INIT_LOCK:
+        if _DB_READY:
+            return
+        _create_schema()
+        _DB_READY = True
+    
+    logger.info("Database initialized successfully")
+
+def _create_schema():
+    with db_cursor() as cur:
+        # Concurrent CREATE ... IF NOT EXISTS can still collide between workers
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        
+        # Create documents table
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id VARCHAR(255) PRIMARY KEY,
+                file_name VARCHAR(500) NOT NULL,
+                file_hash VARCHAR(64) NOT NULL,
+                file_size BIGINT,
+                owner VARCHAR(255) DEFAULT 'anonymous',
+                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                blockchain_tx VARCHAR(66),
+                block_number INTEGER,
+                registered BOOLEAN DEFAULT FALSE,
+                registered_at TIMESTAMP
+            )
+        """)
+        
+        # Added after the first release; NULL for documents uploaded before it
+        cur.execute("""
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_size BIGINT
+        """)
+        
+        # Create history table: append-only audit log, so skip WAL (UNLOGGED).
+        # Postgres truncates unlogged tables after a crash; documents are unaffected.
+        cur.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS history (
+                id SERIAL PRIMARY KEY,
+                action VARCHAR(50) NOT NULL,
+                document_id VARCHAR(255),
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                details JSONB
+            )
+        """)
+        
+        # Convert a history table created before it was UNLOGGED
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF (SELECT relpersistence FROM pg_class WHERE oid = 'history'::regclass) = 'p' THEN
+                    ALTER TABLE history SET UNLOGGED;
+                END IF;
+            END $$
+        """)
+        
+        # Create index on file_hash for faster verification
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_file_hash ON documents(file_hash)
+        """)
+        
+        # Index on upload time so the newest-first listing is a bounded index scan
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_uploaded_at ON documents(uploaded_at DESC)
+        """)
+        
+        _import_legacy_json(cur)
+
+def _legacy_time(value):
+    """Epoch seconds from the JSON store as a UTC datetime (None if unset)"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(float(value), timezone.utc)
+
+def _load_legacy_file(path, default):
+    if not os.path.exists(path):
+        return default
+    
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read legacy {path}, skipping import: {e}")
+        return default
+
+def _import_legacy_json(cur):
+    """One-shot import of hash_db.json / history_db.json into an empty database"""
+    # Only a fresh database qualifies, so the import never runs twice (and a
+    # crash-truncated UNLOGGED history table is not refilled with old events)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM documents) OR EXISTS (SELECT 1 FROM history) AS populated")
+    if cur.fetchone()["populated"]:
+        return
+    
+    documents = _load_legacy_file(LEGACY_DB_FILE, {})
+    history = _load_legacy_file(LEGACY_HISTORY_FILE, [])
+    
+    doc_rows = []
+    for doc_id, meta in documents.items():
+        try:
+            # Hashes are compared verbatim, so store them in the canonical form
+            file_hash = str(meta["fileHash"]).strip().lower().removeprefix("0x")
+            if len(file_hash) != 64 or any(c not in "0123456789abcdef" for c in file_hash):
+                raise ValueError(f"bad hash {meta['fileHash']!r}")
+            
+            doc_rows.append((
+                doc_id,
+                meta.get("fileName") or "unknown",
+                file_hash,
+                meta.get("owner") or "anonymous",
+                _legacy_time(meta.get("timestamp")) or datetime.now(timezone.utc),
+                meta.get("blockchainTx"),
+                meta.get("blockNumber"),
+                bool(meta.get("registered")),
+                _legacy_time(meta.get("registeredAt"))
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            logger.warning(f"Skipping legacy document {doc_id}: {e}")
+    
+    history_rows = []
+    for event in history:
+        try:
+            if not event.get("action"):
+                raise ValueError("no action")
+            history_rows.append((
+                event["action"],
+                event.get("documentID"),
+                _legacy_time(event.get("timestamp")) or datetime.now(timezone.utc),
+                json.dumps(event)
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            logger.warning(f"Skipping legacy history event: {e}")
+    
+    if doc_rows:
+        execute_values(
+            cur,
+            """INSERT INTO documents (document_id, file_name, file_hash, owner, uploaded_at,
+                                      blockchain_tx, block_number, registered, registered_at)
+               VALUES %s ON CONFLICT (document_id) DO NOTHING""",
+            doc_rows
         )
-    """)
-    
-    # Create history table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS history (
-            id SERIAL PRIMARY KEY,
-            action VARCHAR(50) NOT NULL,
-            document_id VARCHAR(255),
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            details JSONB
+    
+    if history_rows:
+        execute_values(
+            cur,
+            "INSERT INTO history (action, document_id, timestamp, details) VALUES %s",
+            history_rows,
+            template="(%s, %s, %s, %s::jsonb)"
         )
-    """)
     
-    # Create index on file_hash for faster verification
-    cur.execute("""
-        CREATE INDEX IF NOT EXISTS idx_file_hash ON documents(file_hash)
-    """)
+    if doc_rows or history_rows:
+        logger.info(f"Imported {len(doc_rows)} documents and {len(history_rows)} history events from legacy JSON")
+
+def execute_prepared(cur, name, params):
+    """Execute a prepared statement, preparing it on first use per connection"""
+    conn = cur.connection
     
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Prepared lazily so a fresh database can still run init_db() first
+    if name not in conn.prepared:
+        param_types, sql = PREPARED_STATEMENTS[name]
+        cur.execute(f"PREPARE {name} ({param_types}) AS {sql}")
+        conn.prepared.add(name)
     
-    logger.info("Database initialized successfully")
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
 
 # Database helper functions
-def save_document(doc_id, file_name, file_hash, owner="anonymous"):
+def check_connection():
+    """Run a trivial query to confirm the database is reachable"""
+    with db_cursor() as cur:
+        cur.execute("SELECT 1")
+
+def save_document(doc_id, file_name, file_hash, owner="anonymous", file_size=None):
     """Save document to database"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        INSERT INTO documents (document_id, file_name, file_hash, owner)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (document_id) DO UPDATE
-        SET file_name = EXCLUDED.file_name,
-            file_hash = EXCLUDED.file_hash,
-            owner = EXCLUDED.owner
-    """, (doc_id, file_name, file_hash, owner))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        execute_prepared(cur, 'save_doc', (doc_id, file_name, file_hash, owner, file_size))
 
 def get_document(doc_id):
     """Retrieve document by ID"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("SELECT * FROM documents WHERE document_id = %s", (doc_id,))
-    doc = cur.fetchone()
-    
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        execute_prepared(cur, 'get_doc', (doc_id,))
+        doc = cur.fetchone()
     
     return dict(doc) if doc else None
 
 def get_document_by_hash(file_hash):
     """Retrieve document by hash"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("SELECT * FROM documents WHERE file_hash = %s", (file_hash,))
-    doc = cur.fetchone()
-    
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        execute_prepared(cur, 'get_doc_by_hash', (file_hash,))
+        doc = cur.fetchone()
     
     return dict(doc) if doc else None
 
-def get_all_documents():
-    """Retrieve all documents"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+def get_documents_by_hashes(file_hashes):
+    """Retrieve documents for many hashes in one query, keyed by file hash"""
+    if not file_hashes:
+        return {}
     
-    cur.execute("SELECT * FROM documents ORDER BY uploaded_at DESC")
-    docs = cur.fetchall()
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT * FROM documents WHERE file_hash = ANY(%s) ORDER BY uploaded_at",
+            (list(file_hashes),)
+        )
+        docs = cur.fetchall()
     
-    cur.close()
-    conn.close()
+    # Same hash uploaded twice: the newest row wins
+    return {doc["file_hash"]: dict(doc) for doc in docs}
+
+def get_all_documents(limit=1000, offset=0):
+    """Retrieve the most recently uploaded documents"""
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT * FROM documents ORDER BY uploaded_at DESC LIMIT %s OFFSET %s",
+            (limit, offset)
+        )
+        docs = cur.fetchall()
     
     return [dict(doc) for doc in docs]
 
+def get_all_file_hashes():
+    """Retrieve every registered file hash"""
+    with db_cursor() as cur:
+        cur.execute("SELECT file_hash FROM documents")
+        rows = cur.fetchall()
+    
+    return [row["file_hash"] for row in rows]
+
 def update_blockchain_tx(doc_id, tx_hash, block_number):
     """Update document with blockchain transaction details"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        UPDATE documents
-        SET blockchain_tx = %s,
-            block_number = %s,
-            registered = TRUE,
-            registered_at = CURRENT_TIMESTAMP
-        WHERE document_id = %s
-    """, (tx_hash, block_number, doc_id))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        execute_prepared(cur, 'update_tx', (tx_hash, block_number, doc_id))
 
 def log_history(action, doc_id=None, details=None):
-    """Log action to history table"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    """Queue an action for the history table (written in batches)"""
+    _start_history_flusher()
+    # Stamp the event now rather than when its batch is flushed
+    _HIST_Q.put((action, doc_id, datetime.now(timezone.utc), json.dumps(details) if details else None))
+
+def _start_history_flusher():
+    global _HIST_FLUSHER
     
-    import json
-    cur.execute("""
-        INSERT INTO history (action, document_id, details)
-        VALUES (%s, %s, %s)
-    """, (action, doc_id, json.dumps(details) if details else None))
+    if _HIST_FLUSHER is None:
+        with _HIST_FLUSHER_LOCK:
+            if _HIST_FLUSHER is None:
+                _HIST_FLUSHER = threading.Thread(target=_flush_history_loop, name="history-flusher", daemon=True)
+                _HIST_FLUSHER.start()
+
+def _write_history(rows):
+    """Insert a batch of queued history rows in one statement and commit"""
+    try:
+        with db_cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO history (action, document_id, timestamp, details) VALUES %s",
+                rows,
+                template="(%s, %s, %s, %s::jsonb)",
+                page_size=HISTORY_BATCH_SIZE
+            )
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} history events: {e}")
+
+def _flush_history_loop():
+    """Collect up to HISTORY_BATCH_SIZE events or HISTORY_FLUSH_INTERVAL worth, then write them"""
+    while True:
+        rows = []
+        row = _HIST_Q.get()
+        deadline = time.monotonic() + HISTORY_FLUSH_INTERVAL
+        
+        while row is not _HIST_STOP:
+            rows.append(row)
+            if len(rows) >= HISTORY_BATCH_SIZE:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = _HIST_Q.get(timeout=remaining)
+            except queue.Empty:
+                break
+        
+        if rows:
+            _write_history(rows)
+        if row is _HIST_STOP:
+            return
+
+@atexit.register
+def flush_history():
+    """Write any queued history events synchronously (runs at interpreter exit)"""
+    # The flusher may hold a half-collected batch, so let it finish rather than
+    # draining the queue around it (those events would be lost with the thread)
+    if _HIST_FLUSHER is not None and _HIST_FLUSHER.is_alive():
+        _HIST_Q.put(_HIST_STOP)
+        _HIST_FLUSHER.join(timeout=HISTORY_SHUTDOWN_TIMEOUT)
+        return
     
-    conn.commit()
-    cur.close()
-    conn.close()
+    rows = []
+    while True:
+        try:
+            rows.append(_HIST_Q.get_nowait())
+        except queue.Empty:
+            break
+    
+    if rows:
+        _write_history(rows)
 
 def get_history(limit=50):
     """Retrieve recent history"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT * FROM history
-        ORDER BY timestamp DESC
-        LIMIT %s
-    """, (limit,))
-    
-    history = cur.fetchall()
-    
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT * FROM history
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s
+        """, (limit,))
+        history = cur.fetchall()
     
     return [dict(h) for h in history]
 
 def get_stats():
     """Get statistics"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT
-            COUNT(*) as total_documents,
-            COUNT(CASE WHEN registered = TRUE THEN 1 END) as registered_count,
-            COUNT(CASE WHEN registered = FALSE THEN 1 END) as pending_count
-        FROM documents
-    """)
-    
-    stats = cur.fetchone()
-    
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT
+                COUNT(*) AS total_documents,
+                COUNT(*) FILTER (WHERE registered) AS registered_count,
+                COUNT(*) FILTER (WHERE NOT registered) AS pending_count
+            FROM documents
+        """)
+        stats = cur.fetchone()
     
     return dict(stats) if stats else {}
+
+def get_verification_counts():
+    """Count verify events across the whole history table"""
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE action = 'verify_success') AS verify_success,
+                COUNT(*) FILTER (WHERE action = 'verify_failed') AS verify_failed
+            FROM history
+        """)
+        counts = cur.fetchone()
+    
+    return dict(counts) if counts else {}
@@ -1,13 +1,26 @@
 # app.py (production-ready for Render with all security fixes)
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, Response
+from flask.json.provider import DefaultJSONProvider
 from flasgger import Swagger
-import hashlib, os, json, time, uuid, logging, re
-from datetime import datetime
+import hashlib, os, json, time, uuid, logging, re, threading, ssl
+import orjson
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from web3 import Web3
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from Database import (
+    init_db, check_connection, save_document, get_document, get_document_by_hash,
+    get_documents_by_hashes, get_all_documents, get_all_file_hashes, update_blockchain_tx, log_history, get_history,
+    get_stats, get_verification_counts
+)
+from Cache import (
+    REDIS_URL, get_redis, schedule_hash_filter_seed, add_to_hash_filter, hash_maybe_registered, cached, invalidate_cache,
+    increment_counter, get_counters
+)
 
 # ============================================
 # LOAD ENVIRONMENT VARIABLES
@@ -37,6 +50,8 @@ if not CONTRACT_ADDRESS_RAW:
     raise ValueError("❌ CONTRACT_ADDRESS environment variable is required.")
 if not ACCOUNT_ADDRESS_RAW:
     raise ValueError("❌ ACCOUNT_ADDRESS environment variable is required.")
+if not os.environ.get("DATABASE_URL"):
+    raise ValueError("❌ DATABASE_URL environment variable is required.")
 
 # Initialize Web3
 try:
@@ -49,6 +64,18 @@ try:
 except Exception as e:
     raise ConnectionError(f"❌ Web3 initialization failed: {str(e)}")
 
+# Cache the node connectivity check so frequent health probes don't each cost an RPC
+WEB3_STATUS_TTL = 5  # seconds
+_web3_status = {"connected": True, "checked_at": time.monotonic()}
+
+def web3_connected():
+    """Return w3.is_connected(), refreshed at most every WEB3_STATUS_TTL seconds"""
+    now = time.monotonic()
+    if now - _web3_status["checked_at"] > WEB3_STATUS_TTL:
+        _web3_status["connected"] = w3.is_connected()
+        _web3_status["checked_at"] = now
+    return _web3_status["connected"]
+
 # Load ABI
 ABI_FILE = "contract_abi.json"
 CONTRACT_ABI = None
@@ -61,25 +88,63 @@ if os.path.exists(ABI_FILE):
         print(f"⚠️  Failed to load contract ABI: {e}")
         CONTRACT_ABI = None
 
+# Contract details never change after boot, so serialize the response once
+CONTRACT_JSON = orjson.dumps({
+    "contract_address": CONTRACT_ADDRESS,
+    "contract_abi": CONTRACT_ABI,
+    "network": "Sepolia Testnet",
+    "explorer": f"https://sepolia.etherscan.io/address/{CONTRACT_ADDRESS}"
+})
+
+# Upload response fields that are the same for every upload
+UPLOAD_RESPONSE_STATIC = {
+    "success": True,
+    "instruction": "CALL_CONTRACT_WITH_METAMASK",
+    "contract_address": CONTRACT_ADDRESS,
+    "contract_abi_available": CONTRACT_ABI is not None,
+    "message": "File uploaded. Please complete blockchain registration via MetaMask."
+}
+
 # ============================================
 # FLASK APP SETUP
 # ============================================
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, so jsonify() and request.json use it too"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Frontend assets (style.css, script.js, ...) are served by Flask's static handler
 app = Flask(__name__, template_folder="frontend", static_folder="frontend", static_url_path='')
+app.json = OrjsonProvider(app)
 
 # Security Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max file size
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(32).hex())
 
+# Static files: asset names are unversioned, so browsers revalidate by default (ETag/304);
+# hand the transfer to nginx/Apache via X-Sendfile when deployed behind one
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('STATIC_MAX_AGE', 0))
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+
 # Swagger API Documentation
 swagger = Swagger(app)
 
-# Rate Limiting
+# Rate Limiting (Redis shares counters across workers and reuses the cache's connection pool)
+redis_client = get_redis()
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=REDIS_URL if redis_client else "memory://",
+    storage_options={"connection_pool": redis_client.connection_pool} if redis_client else {},
+    # Keep limiting per process instead of failing requests while Redis is down
+    in_memory_fallback_enabled=True
 )
 
 # CORS Configuration
@@ -92,13 +157,7 @@ CORS(app, resources={
 })
 
 # File Configuration
-UPLOAD_FOLDER = "uploads"
-DB_FILE = "hash_db.json"
-HISTORY_FILE = "history_db.json"
-ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'txt', 'doc', 'docx', 'zip'}
-
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs("temp", exist_ok=True)
+ALLOWED_EXTENSIONS = frozenset({'pdf', 'png', 'jpg', 'jpeg', 'txt', 'doc', 'docx', 'zip'})
 
 # Logging Configuration
 logging.basicConfig(
@@ -111,6 +170,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Initialize PostgreSQL schema
+try:
+    init_db()
+    print("✅ Database initialized")
+except Exception as e:
+    raise ConnectionError(f"❌ Database initialization failed: {str(e)}")
+
+# Rebuild the Redis bloom filter of registered hashes in the background (no-op without REDIS_URL)
+schedule_hash_filter_seed(get_all_file_hashes)
+
 # ============================================
 # SECURITY HEADERS & MIDDLEWARE
 # ============================================
@@ -153,110 +222,277 @@ def ratelimit_handler(e):
 # VALIDATION FUNCTIONS
 # ============================================
 
+# Allow only alphanumeric, spaces, hyphens, underscores (max 50 chars)
+_OWNER_RE = re.compile(r'^[a-zA-Z0-9\s\-_]{1,50}\Z')
+
 def validate_owner_name(owner):
     """Validate owner name to prevent XSS"""
     if not owner:
         return "anonymous"
     
-    # Allow only alphanumeric, spaces, hyphens, underscores (max 50 chars)
-    if not re.match(r'^[a-zA-Z0-9\s\-_]{1,50}$', owner):
+    if not _OWNER_RE.match(owner):
         raise ValueError("Invalid owner name. Use only letters, numbers, spaces, hyphens, and underscores (max 50 chars)")
     
     return owner.strip()
 
 def validate_document_id(doc_id):
-    """Validate document ID format (UUID)"""
-    if not re.match(r'^[a-f0-9\-]{36}$', doc_id):
+    """Validate document ID format (UUID) and return its canonical form"""
+    try:
+        return str(uuid.UUID(doc_id))
+    except (ValueError, TypeError, AttributeError):
         raise ValueError("Invalid document ID format")
-    return doc_id
+
+# Uploaders often name files after their own SHA-256 ("<hash>.pdf")
+_HASH_NAME_RE = re.compile(r'[0-9a-fA-F]{64}\Z')
+
+def filename_hash_candidate(filename):
+    """Return the hash embedded in a "<sha256>.<ext>" filename, if any
+    
+    Only a hint: the client controls the filename, so callers must still
+    hash the content and trust the candidate only when the two match.
+    """
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    return stem.lower() if _HASH_NAME_RE.match(stem) else None
+
+# Names secure_filename() would return unchanged (it strips leading/trailing "._")
+_SAFE_FILENAME_RE = re.compile(r'[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?\Z')
+
+def safe_filename(filename):
+    """secure_filename() with a fast path for names that are already safe"""
+    # Windows also reserves device names (CON, NUL, ...), so always use werkzeug there
+    if os.name != "nt" and _SAFE_FILENAME_RE.match(filename):
+        return filename
+    return secure_filename(filename)
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
 
 # ============================================
-# DATABASE FUNCTIONS (JSON - For backward compatibility)
+# DATABASE FUNCTIONS (PostgreSQL)
 # ============================================
 
-def init_db():
-    """Initialize JSON database file"""
-    if not os.path.exists(DB_FILE):
-        with open(DB_FILE, "w") as f:
-            json.dump({}, f)
-        logger.info("Initialized hash_db.json")
+def to_epoch(ts):
+    """Convert a UTC database timestamp to Unix seconds"""
+    if ts is None:
+        return None
+    return int(ts.replace(tzinfo=timezone.utc).timestamp())
+
+def serialize_document(doc):
+    """Map a documents row to the camelCase shape the frontend expects"""
+    return {
+        "documentID": doc["document_id"],
+        "fileName": doc["file_name"],
+        "fileHash": doc["file_hash"],
+        "owner": doc["owner"],
+        "timestamp": to_epoch(doc["uploaded_at"]),
+        "blockchainTx": doc["blockchain_tx"],
+        "blockNumber": doc["block_number"],
+        "registered": doc["registered"],
+        "registeredAt": to_epoch(doc["registered_at"]),
+        "fileSize": doc.get("file_size")
+    }
 
-def load_db():
-    """Load database from JSON file"""
-    init_db()
+# ============================================
+# HASHING
+# ============================================
+
+class CryptographySHA256:
+    """hashlib-style SHA-256 backed by pyca/cryptography's bundled OpenSSL"""
+    
+    def __init__(self):
+        from cryptography.hazmat.primitives import hashes
+        self._hash = hashes.Hash(hashes.SHA256())
+    
+    def update(self, data):
+        self._hash.update(data)
+    
+    def hexdigest(self):
+        return self._hash.finalize().hex()
+
+def select_sha256():
+    """Prefer OpenSSL SHA-256, which uses SHA-NI / ARMv8 crypto instructions when present"""
+    if getattr(hashlib.sha256, "__name__", "") == "openssl_sha256":
+        return hashlib.sha256, "hashlib (OpenSSL)"
+    
+    # Python built without OpenSSL hashing falls back to slower portable C code
     try:
-        with open(DB_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        logger.warning("Failed to decode DB file, returning empty dict")
-        return {}
-
-def save_db(db):
-    """Save database to JSON file"""
-    with open(DB_FILE, "w") as f:
-        json.dump(db, f, indent=2)
-
-def generate_chunk_hash(file_path, chunk_size=8192):
-    """Generate SHA-256 hash of file using chunked reading"""
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(chunk_size), b""):
+        CryptographySHA256()
+        return CryptographySHA256, "cryptography (OpenSSL)"
+    except Exception:
+        return hashlib.sha256, "hashlib (builtin)"
+
+SHA256, SHA256_BACKEND = select_sha256()
+
+# One read buffer per thread (hash pool workers live for the whole process)
+_HASH_BUFFERS = threading.local()
+
+def hash_buffer(size):
+    """Return this thread's reusable read buffer, at least size bytes"""
+    buf = getattr(_HASH_BUFFERS, "buf", None)
+    if buf is None or len(buf) < size:
+        buf = _HASH_BUFFERS.buf = bytearray(size)
+    return buf
+
+def hash_stream(stream, chunk_size=1 << 20):
+    """Generate SHA-256 hash directly from a binary stream without touching disk"""
+    can_readinto = hasattr(stream, "readinto")
+    
+    # Python 3.11+: hashlib's own loop (zero-copy for BytesIO); it rejects
+    # streams without readinto(), so those take the manual path below
+    if hasattr(hashlib, "file_digest") and (can_readinto or hasattr(stream, "getbuffer")):
+        return hashlib.file_digest(stream, SHA256).hexdigest()
+    
+    # Otherwise reuse the thread's buffer instead of allocating per chunk or call
+    sha256_hash = SHA256()
+    if can_readinto:
+        view = memoryview(hash_buffer(chunk_size))[:chunk_size]
+        while n := stream.readinto(view):
+            sha256_hash.update(view[:n])
+    else:
+        while chunk := stream.read(chunk_size):
             sha256_hash.update(chunk)
     return sha256_hash.hexdigest()
 
+# hashlib releases the GIL while hashing, so pool threads hash in parallel.
+# All request hashing goes through here, bounding CPU-heavy work to one thread per core
+# however many gunicorn threads are serving requests.
+HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="hash")
+
+def hash_streams_parallel(streams):
+    """Hash several upload streams concurrently on the shared hash pool"""
+    return list(HASH_POOL.map(hash_stream, streams))
+
+def stream_size(stream):
+    """Byte length of a seekable upload stream (None if it can't seek)"""
+    try:
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(0)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+def log_hash_throughput(size=16 * 1024 * 1024):
+    """Hash a max-size upload once at boot so slow (non-accelerated) deploys show up in logs"""
+    buf = bytes(size)
+    start = time.perf_counter()
+    h = SHA256()
+    h.update(buf)
+    h.hexdigest()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"SHA-256 backend: {SHA256_BACKEND}, {ssl.OPENSSL_VERSION}, "
+        f"{size / (1 << 20) / elapsed:.0f} MiB/s"
+    )
+
+log_hash_throughput()
+
 # ============================================
 # HISTORY FUNCTIONS
 # ============================================
 
-def init_history():
-    """Initialize history JSON file"""
-    if not os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "w") as f:
-            json.dump([], f)
-        logger.info("Initialized history_db.json")
-
-def load_history():
-    """Load history from JSON file"""
-    init_history()
-    try:
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        logger.warning("Failed to decode history file, returning empty list")
-        return []
-
-def save_history(history):
-    """Save history to JSON file"""
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
-
-def append_history(event: dict):
-    """Append event to history"""
-    history = load_history()
-    history.append(event)
-    # Keep only last 1000 events to prevent unbounded growth
-    if len(history) > 1000:
-        history = history[-1000:]
-    save_history(history)
+# Keep only last 1000 events in memory to prevent unbounded growth;
+# the full log lives in the Postgres history table
+HISTORY_LIMIT = 1000
+_RECENT = deque(maxlen=HISTORY_LIMIT)
+_RECENT_LOCK = threading.Lock()
+
+# History actions counted as verifications in /api/stats; the totals are kept
+# in process (seeded once at boot) so /api/stats never scans the history table
+VERIFY_ACTIONS = ("verify_success", "verify_failed")
+_VERIFY_COUNTS = dict.fromkeys(VERIFY_ACTIONS, 0)
+_COUNTS_LOCK = threading.Lock()
+
+def load_recent_history():
+    """Seed the in-memory history from the most recent Postgres events"""
+    events = [h["details"] for h in get_history(HISTORY_LIMIT) if h.get("details")]
+    with _RECENT_LOCK:
+        _RECENT.clear()
+        _RECENT.extend(reversed(events))
+
+def load_verification_counts():
+    """Seed the in-process verification totals from the history table"""
+    counts = get_verification_counts()
+    with _COUNTS_LOCK:
+        for action in VERIFY_ACTIONS:
+            _VERIFY_COUNTS[action] = counts.get(action, 0)
+
+def recent_history(newest_first=False):
+    """Snapshot of recent history events, oldest first unless newest_first"""
+    with _RECENT_LOCK:
+        # Events are appended in time order, so reversing is already sorted
+        return list(reversed(_RECENT)) if newest_first else list(_RECENT)
+
+def verification_counts():
+    """(successful, failed) verification totals"""
+    with _COUNTS_LOCK:
+        # Shared Redis counters when available, seeded from this process's
+        # totals (which include events still queued for the history table)
+        counts = get_counters(VERIFY_ACTIONS, lambda: dict(_VERIFY_COUNTS))
+        if counts is None:
+            counts = dict(_VERIFY_COUNTS)
+    return counts.get("verify_success", 0), counts.get("verify_failed", 0)
+
+def append_history(event: dict, invalidate=True):
+    """Append event to history (pass invalidate=False when batching, then invalidate once)"""
+    action = event.get("action")
+    with _RECENT_LOCK:
+        _RECENT.append(event)
+    if action in VERIFY_ACTIONS:
+        with _COUNTS_LOCK:
+            _VERIFY_COUNTS[action] += 1
+            increment_counter(action)
+    log_history(event.get("action"), event.get("documentID"), event)
+    # Verification counts in /api/stats are derived from history
+    if invalidate:
+        invalidate_cache("history", "stats")
+
+# Restore recent events and verification totals so they survive restarts
+try:
+    load_recent_history()
+    load_verification_counts()
+except Exception as e:
+    logger.warning(f"Failed to load recent history: {e}")
 
 # ============================================
-# STATIC FILE ROUTES
+# RESPONSE HELPERS
 # ============================================
 
-@app.route('/style.css')
-def serve_css():
-    """Serve CSS file with correct MIME type"""
-    return send_from_directory('frontend', 'style.css', mimetype='text/css')
+def json_response(obj, status=200):
+    """Serialize with orjson (much faster than jsonify for large lists)"""
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
+# The UI never lists more than this many documents at once
+DOCUMENTS_PAGE_LIMIT = 1000
+
+def stream_json_array(items, serialize=None):
+    """Stream a JSON array item by item instead of buffering one big dump"""
+    def generate():
+        sep = b"["
+        for item in items:
+            yield sep + orjson.dumps(serialize(item) if serialize else item)
+            sep = b","
+        yield b"[]" if sep == b"[" else b"]"
+    
+    return Response(generate(), mimetype="application/json")
+
+def get_pagination(max_limit):
+    """Read ?limit=&offset= query params, bounded to max_limit"""
+    try:
+        limit = int(request.args.get("limit", max_limit))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    
+    if limit < 0 or offset < 0:
+        raise ValueError("limit and offset must be non-negative")
+    
+    return min(limit, max_limit), offset
 
-@app.route('/script.js')
-def serve_js():
-    """Serve JavaScript file with correct MIME type"""
-    return send_from_directory('frontend', 'script.js', mimetype='application/javascript')
+def page_cache_field(max_limit):
+    """Cache field for a paginated view: the parsed (limit, offset), not the raw query"""
+    return lambda: "{}:{}".format(*get_pagination(max_limit))
 
 # ============================================
 # PAGE ROUTES
@@ -308,36 +544,20 @@ def upload_document():
                 "error": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             }), 400
 
-        filename = secure_filename(file.filename)
+        filename = safe_filename(file.filename)
         document_id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_FOLDER, f"{document_id}_{filename}")
-        file.save(file_path)
-
-        file_hash = generate_chunk_hash(file_path)
-        
-        try:
-            os.remove(file_path)
-            logger.info(f"Deleted temporary file: {file_path}")
-        except Exception as e:
-            logger.warning(f"Failed to delete file: {e}")
+        file_size = stream_size(file.stream)
+        # Same pool as /verify, so concurrent hashing never exceeds the core count
+        file_hash = HASH_POOL.submit(hash_stream, file.stream).result()
 
         owner = request.form.get("owner", "anonymous")
         owner = validate_owner_name(owner)
         
         ts_now = int(time.time())
 
-        db = load_db()
-        db[document_id] = {
-            "fileName": filename,
-            "fileHash": file_hash,
-            "owner": owner,
-            "timestamp": ts_now,
-            "blockchainTx": None,
-            "blockNumber": None,
-            "registered": False,
-            "registeredAt": None
-        }
-        save_db(db)
+        save_document(document_id, filename, file_hash, owner, file_size)
+        add_to_hash_filter(file_hash)
+        invalidate_cache("documents", "stats")
 
         append_history({
             "timestamp": ts_now,
@@ -353,16 +573,12 @@ def upload_document():
         logger.info(f"✅ Document uploaded and prepared: {document_id}")
 
         return jsonify({
-            "success": True,
+            **UPLOAD_RESPONSE_STATIC,
             "documentID": document_id,
             "fileName": filename,
             "fileHash": file_hash,
             "owner": owner,
             "timestamp": ts_now,
-            "instruction": "CALL_CONTRACT_WITH_METAMASK",
-            "contract_address": CONTRACT_ADDRESS,
-            "contract_abi_available": CONTRACT_ABI is not None,
-            "message": "File uploaded. Please complete blockchain registration via MetaMask."
         }), 200
 
     except ValueError as e:
@@ -387,18 +603,14 @@ def confirm_register():
 
         document_id = validate_document_id(document_id)
 
-        db = load_db()
-        meta = db.get(document_id)
+        doc = get_document(document_id)
         
-        if not meta:
+        if not doc:
             return jsonify({"error": "Document not found in registry"}), 404
 
-        meta["blockchainTx"] = blockchain_tx
-        meta["blockNumber"] = block_number
-        meta["registered"] = True
-        meta["registeredAt"] = int(time.time())
-        db[document_id] = meta
-        save_db(db)
+        meta = serialize_document(doc)
+        update_blockchain_tx(document_id, blockchain_tx, block_number)
+        invalidate_cache("documents", "stats")
 
         append_history({
             "timestamp": int(time.time()),
@@ -448,19 +660,6 @@ def verify_document():
                 "message": "Empty filename"
             }), 400
 
-        temp_path = os.path.join("temp", str(uuid.uuid4()))
-        file.save(temp_path)
-        provided_hash = generate_chunk_hash(temp_path)
-        
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
-
-        provided_hash_norm = provided_hash.replace("0x", "").lower()
-        db = load_db()
-        ts_now = int(time.time())
-
         document_id = (request.form.get("documentID") or 
                       request.form.get("documentId") or 
                       request.form.get("document_id"))
@@ -475,8 +674,48 @@ def verify_document():
                     "message": "Invalid document ID format"
                 }), 400
 
-            meta = db.get(document_id)
-            if not meta:
+        if document_id:
+            # Look the document up before hashing: a size mismatch means the
+            # hash cannot match, so a wrong or tampered file skips hashing entirely
+            doc = get_document(document_id)
+            stored_size = doc.get("file_size") if doc else None
+            size = stream_size(file.stream) if stored_size is not None else None
+            # Only short-circuit when both sizes are known; otherwise fall back to hashing
+            if size is not None and size != stored_size:
+                meta = serialize_document(doc)
+                append_history({
+                    "timestamp": int(time.time()),
+                    "action": "verify_failed",
+                    "fileName": meta.get("fileName"),
+                    "documentID": document_id,
+                    "fileHash": None,
+                    "success": False,
+                    "blockchainTx": meta.get("blockchainTx"),
+                    "reason": "tampered"
+                })
+                return jsonify({
+                    "verified": False,
+                    "reason": "tampered",
+                    "computed_hash": None,
+                    "stored_hash": meta.get("fileHash"),
+                    "documentID": document_id,
+                    "fileName": meta.get("fileName"),
+                    "blockchain_tx": meta.get("blockchainTx"),
+                    "message": "⚠️ Document has been tampered with. File size does not match the registered document."
+                }), 200
+            provided_hash = HASH_POOL.submit(hash_stream, file.stream).result()
+        else:
+            # Hash on the pool; a hash-named file lets the by-hash lookup overlap with it
+            candidate_hash = filename_hash_candidate(file.filename)
+            hash_future = HASH_POOL.submit(hash_stream, file.stream)
+            doc = get_document_by_hash(candidate_hash) if candidate_hash else None
+            provided_hash = hash_future.result()
+
+        # provided_hash is lowercase hex without 0x, the same form stored at upload
+        ts_now = int(time.time())
+
+        if document_id:
+            if not doc:
                 append_history({
                     "timestamp": ts_now,
                     "action": "verify_failed",
@@ -495,10 +734,10 @@ def verify_document():
                     "message": "Document ID not found in registry"
                 }), 200
 
-            stored_hash = (meta.get("fileHash") or "").replace("0x", "").lower()
+            meta = serialize_document(doc)
             blockchain_tx = meta.get("blockchainTx")
 
-            if stored_hash == provided_hash_norm:
+            if meta.get("fileHash") == provided_hash:
                 append_history({
                     "timestamp": ts_now,
                     "action": "verify_success",
@@ -543,29 +782,35 @@ def verify_document():
                     "message": "⚠️ Document has been tampered with. Hash mismatch detected."
                 }), 200
 
-        for doc_id, meta in db.items():
-            if (meta.get("fileHash") or "").replace("0x", "").lower() == provided_hash_norm:
-                append_history({
-                    "timestamp": ts_now,
-                    "action": "verify_success",
-                    "fileName": meta.get("fileName"),
-                    "documentID": doc_id,
-                    "fileHash": provided_hash,
-                    "success": True,
-                    "blockchainTx": meta.get("blockchainTx"),
-                })
-                return jsonify({
-                    "verified": True,
-                    "reason": "verified",
-                    "computed_hash": provided_hash,
-                    "documentID": doc_id,
-                    "fileName": meta.get("fileName"),
-                    "owner": meta.get("owner"),
-                    "timestamp": meta.get("timestamp"),
-                    "blockchain_tx": meta.get("blockchainTx"),
-                    "blockNumber": meta.get("blockNumber"),
-                    "message": "✅ Document found and verified by hash"
-                }), 200
+        # The prefetched row only counts if the content really hashes to the filename.
+        # Otherwise the bloom prefilter skips the database for hashes that are
+        # definitely unknown, else do an indexed lookup on documents.file_hash
+        if candidate_hash != provided_hash:
+            doc = get_document_by_hash(provided_hash) if hash_maybe_registered(provided_hash) else None
+        if doc:
+            meta = serialize_document(doc)
+            doc_id = meta["documentID"]
+            append_history({
+                "timestamp": ts_now,
+                "action": "verify_success",
+                "fileName": meta.get("fileName"),
+                "documentID": doc_id,
+                "fileHash": provided_hash,
+                "success": True,
+                "blockchainTx": meta.get("blockchainTx"),
+            })
+            return jsonify({
+                "verified": True,
+                "reason": "verified",
+                "computed_hash": provided_hash,
+                "documentID": doc_id,
+                "fileName": meta.get("fileName"),
+                "owner": meta.get("owner"),
+                "timestamp": meta.get("timestamp"),
+                "blockchain_tx": meta.get("blockchainTx"),
+                "blockNumber": meta.get("blockNumber"),
+                "message": "✅ Document found and verified by hash"
+            }), 200
 
         append_history({
             "timestamp": ts_now,
@@ -600,60 +845,111 @@ def verify_document():
             "message": "An internal server error occurred"
         }), 500
 
-@app.route("/api/documents", methods=["GET"])
-def list_documents():
-    """List all documents"""
+# Upper bound on files per batch request (the 16 MB body limit still applies)
+MAX_BATCH_FILES = 20
+
+@app.route("/api/batch_verify", methods=["POST"])
+# 5 x MAX_BATCH_FILES keeps batches within the 100 per hour budget of /verify
+@limiter.limit("5 per hour")
+def batch_verify():
+    """Verify several files by hash in one request"""
     try:
-        db = load_db()
-        docs = []
-        for doc_id, meta in db.items():
-            docs.append({
-                "documentID": doc_id,
-                "fileName": meta.get("fileName"),
-                "fileHash": meta.get("fileHash"),
+        files = [f for f in request.files.getlist("files") if f.filename]
+        if not files:
+            return jsonify({"error": "No files provided"}), 400
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({"error": f"Too many files. Maximum is {MAX_BATCH_FILES} per request"}), 400
+
+        hashes = hash_streams_parallel([f.stream for f in files])
+        candidates = {h for h in hashes if hash_maybe_registered(h)}
+        docs = get_documents_by_hashes(candidates)
+        ts_now = int(time.time())
+
+        results = []
+        for file, file_hash in zip(files, hashes):
+            doc = docs.get(file_hash)
+            meta = serialize_document(doc) if doc else {}
+            append_history({
+                "timestamp": ts_now,
+                "action": "verify_success" if doc else "verify_failed",
+                "fileName": meta.get("fileName", file.filename),
+                "documentID": meta.get("documentID"),
+                "fileHash": file_hash,
+                "success": bool(doc),
+                "blockchainTx": meta.get("blockchainTx"),
+                **({} if doc else {"reason": "not_registered"})
+            }, invalidate=False)
+            results.append({
+                "fileName": file.filename,
+                "verified": bool(doc),
+                "reason": "verified" if doc else "not_registered",
+                "computed_hash": file_hash,
+                "documentID": meta.get("documentID"),
                 "owner": meta.get("owner"),
                 "timestamp": meta.get("timestamp"),
-                "blockchainTx": meta.get("blockchainTx"),
-                "blockNumber": meta.get("blockNumber"),
-                "registered": meta.get("registered", False),
-                "registeredAt": meta.get("registeredAt")
+                "blockchain_tx": meta.get("blockchainTx"),
+                "blockNumber": meta.get("blockNumber")
             })
-        docs_sorted = sorted(docs, key=lambda d: d.get("timestamp", 0), reverse=True)
-        return jsonify(docs_sorted)
+        invalidate_cache("history", "stats")
+
+        return jsonify({
+            "results": results,
+            "total": len(results),
+            "verified_count": sum(1 for r in results if r["verified"])
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Batch verify error: {str(e)}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+@app.route("/api/documents", methods=["GET"])
+@cached("documents", ttl=300, vary=page_cache_field(DOCUMENTS_PAGE_LIMIT))
+def list_documents():
+    """List documents, newest first (?limit=&offset=)"""
+    try:
+        limit, offset = get_pagination(DOCUMENTS_PAGE_LIMIT)
+        # Already ordered by the query; cached per page until the next write
+        docs = get_all_documents(limit, offset)
+        return stream_json_array(docs, serialize_document)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"List documents error: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve documents"}), 500
 
 @app.route("/api/history", methods=["GET"])
+@cached("history", vary=page_cache_field(HISTORY_LIMIT))
 def api_history():
-    """Get history"""
+    """Get history, newest first (?limit=&offset=)"""
     try:
-        history = load_history()
-        history_sorted = sorted(history, key=lambda h: h.get("timestamp", 0), reverse=True)
-        return jsonify(history_sorted)
+        limit, offset = get_pagination(HISTORY_LIMIT)
+        history = recent_history(newest_first=True)
+        return stream_json_array(history[offset:offset + limit])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"History error: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to retrieve history"}), 500
 
 @app.route("/api/stats", methods=["GET"])
+@cached("stats", ttl=10)
 def stats():
     """Get stats"""
     try:
-        db = load_db()
-        history = load_history()
+        doc_stats = get_stats()
+        successful_verifications, failed_verifications = verification_counts()
         
-        total_docs = len(db)
-        registered_docs = sum(1 for meta in db.values() if meta.get("registered", False))
-        total_verifications = sum(1 for h in history if h.get("action") in ["verify_success", "verify_failed"])
-        successful_verifications = sum(1 for h in history if h.get("action") == "verify_success")
+        total_docs = doc_stats.get("total_documents", 0)
+        registered_docs = doc_stats.get("registered_count", 0)
+        total_verifications = successful_verifications + failed_verifications
         
-        return jsonify({
+        return json_response({
             "total_documents": total_docs,
             "registered_documents": registered_docs,
             "pending_documents": total_docs - registered_docs,
             "total_verifications": total_verifications,
             "successful_verifications": successful_verifications,
-            "failed_verifications": total_verifications - successful_verifications
+            "failed_verifications": failed_verifications
         })
     except Exception as e:
         logger.error(f"Stats error: {str(e)}", exc_info=True)
@@ -662,33 +958,32 @@ def stats():
 @app.route("/api/contract", methods=["GET"])
 def api_contract():
     """Get contract details"""
-    return jsonify({
-        "contract_address": CONTRACT_ADDRESS,
-        "contract_abi": CONTRACT_ABI,
-        "network": "Sepolia Testnet",
-        "explorer": f"https://sepolia.etherscan.io/address/{CONTRACT_ADDRESS}"
-    })
+    return app.response_class(CONTRACT_JSON, mimetype="application/json")
 
 @app.route("/health", methods=["GET"])
 def health():
     """Health check"""
     try:
-        is_connected = w3.is_connected()
-        db_accessible = os.path.exists(DB_FILE)
+        is_connected = web3_connected()
+        try:
+            check_connection()
+            db_accessible = True
+        except Exception:
+            db_accessible = False
         
-        return jsonify({
+        return json_response({
             "status": "healthy" if is_connected and db_accessible else "degraded",
             "timestamp": int(time.time()),
             "web3_connected": is_connected,
             "database_accessible": db_accessible,
             "version": "2.0.0"
-        }), 200
+        })
     except Exception as e:
-        return jsonify({
+        return json_response({
             "status": "unhealthy",
             "error": str(e),
             "timestamp": int(time.time())
-        }), 500
+        }, 500)
 
 @app.route("/<path:path>", methods=["OPTIONS"])
 def handle_options(path):
@@ -716,6 +1011,7 @@ if __name__ == "__main__":
     print(f"✅ Server starting on port {port}")
     print(f"✅ Debug mode: {debug_mode}")
     print(f"✅ API Documentation: http://localhost:{port}/apidocs")
+    print("⚠️  Development server only; use gunicorn (see Procfile) in production")
     print("=" * 50)
     
     app.run(debug=debug_mode, host="0.0.0.0", port=port)